@@ -78,21 +78,24 @@ def get_offer_ids(campaign_id, market_token):
 
 
 def create_stocks(watch_remnants, offer_ids, warehouse_id):
-    # Уберем то, что не загружено в market
+    # Уберем то, что не загружено в market; offer_ids не изменяется.
     stocks = list()
+    offer_set = set(offer_ids)
+    matched = set()
     date = str(datetime.datetime.utcnow().replace(microsecond=0).isoformat() + "Z")
     for watch in watch_remnants:
-        if str(watch.get("Код")) in offer_ids:
-            count = str(watch.get("Количество"))
+        code = str(watch["Код"])
+        if code in offer_set and code not in matched:
+            count = str(watch["Количество"])
             if count == ">10":
                 stock = 100
             elif count == "1":
                 stock = 0
             else:
-                stock = int(watch.get("Количество"))
+                stock = int(count)
             stocks.append(
                 {
-                    "sku": str(watch.get("Код")),
+                    "sku": code,
                     "warehouseId": warehouse_id,
                     "items": [
                         {
@@ -103,9 +106,9 @@ def create_stocks(watch_remnants, offer_ids, warehouse_id):
                     ],
                 }
             )
-            offer_ids.remove(str(watch.get("Код")))
+            matched.add(code)
     # Добавим недостающее из загруженного:
-    for offer_id in offer_ids:
+    for offer_id in offer_set - matched:
         stocks.append(
             {
                 "sku": offer_id,
@@ -124,13 +127,15 @@ def create_stocks(watch_remnants, offer_ids, warehouse_id):
 
 def create_prices(watch_remnants, offer_ids):
     prices = []
+    offer_set = set(offer_ids)
     for watch in watch_remnants:
-        if str(watch.get("Код")) in offer_ids:
+        code = str(watch["Код"])
+        if code in offer_set:
             price = {
-                "id": str(watch.get("Код")),
+                "id": code,
                 # "feed": {"id": 0},
                 "price": {
-                    "value": int(price_conversion(watch.get("Цена"))),
+                    "value": int(price_conversion(watch["Цена"])),
                     # "discountBase": 0,
                     "currencyId": "RUR",
                     # "vat": 0,
@@ -142,18 +147,20 @@ def create_prices(watch_remnants, offer_ids):
     return prices
 
 
-async def upload_prices(watch_remnants, campaign_id, market_token):
-    offer_ids = get_offer_ids(campaign_id, market_token)
+async def upload_prices(watch_remnants, campaign_id, market_token, offer_ids=None):
+    if offer_ids is None:
+        offer_ids = get_offer_ids(campaign_id, market_token)
     prices = create_prices(watch_remnants, offer_ids)
-    for some_prices in list(divide(prices, 500)):
+    for some_prices in divide(prices, 500):
         update_price(some_prices, campaign_id, market_token)
     return prices
 
 
-async def upload_stocks(watch_remnants, campaign_id, market_token, warehouse_id):
-    offer_ids = get_offer_ids(campaign_id, market_token)
+async def upload_stocks(watch_remnants, campaign_id, market_token, warehouse_id, offer_ids=None):
+    if offer_ids is None:
+        offer_ids = get_offer_ids(campaign_id, market_token)
     stocks = create_stocks(watch_remnants, offer_ids, warehouse_id)
-    for some_stock in list(divide(stocks, 2000)):
+    for some_stock in divide(stocks, 2000):
         update_stocks(some_stock, campaign_id, market_token)
     not_empty = list(
         filter(lambda stock: (stock.get("items")[0].get("count") != 0), stocks)
@@ -169,25 +176,25 @@ def main():
     warehouse_fbs_id = env.str("WAREHOUSE_FBS_ID")
     warehouse_dbs_id = env.str("WAREHOUSE_DBS_ID")
 
-    watch_remnants = download_stock()
+    watch_remnants = download_stock().to_dict(orient="records")
     try:
         # FBS
         offer_ids = get_offer_ids(campaign_fbs_id, market_token)
         # Обновить остатки FBS
         stocks = create_stocks(watch_remnants, offer_ids, warehouse_fbs_id)
-        for some_stock in list(divide(stocks, 2000)):
+        for some_stock in divide(stocks, 2000):
             update_stocks(some_stock, campaign_fbs_id, market_token)
         # Поменять цены FBS
-        upload_prices(watch_remnants, campaign_fbs_id, market_token)
+        upload_prices(watch_remnants, campaign_fbs_id, market_token, offer_ids)
 
         # DBS
         offer_ids = get_offer_ids(campaign_dbs_id, market_token)
         # Обновить остатки DBS
         stocks = create_stocks(watch_remnants, offer_ids, warehouse_dbs_id)
-        for some_stock in list(divide(stocks, 2000)):
+        for some_stock in divide(stocks, 2000):
             update_stocks(some_stock, campaign_dbs_id, market_token)
         # Поменять цены DBS
-        upload_prices(watch_remnants, campaign_dbs_id, market_token)
+        upload_prices(watch_remnants, campaign_dbs_id, market_token, offer_ids)
     except requests.exceptions.ReadTimeout:
         print("Превышено время ожидания...")
     except requests.exceptions.ConnectionError as error:
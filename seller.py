@@ -1,15 +1,52 @@
+import asyncio
+import functools
 import io
+import itertools
 import logging.config
 import os
 import re
+import shutil
+import tempfile
 import zipfile
 from environs import Env
 
+import numpy as np
+import orjson
 import pandas as pd
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 logger = logging.getLogger(__file__)
 
+# Общая сессия с пулом соединений: повторное использование TCP/TLS-соединения
+# к api-seller.ozon.ru избавляет от рукопожатия на каждый запрос.
+_SESSION = requests.Session()
+_SESSION.mount(
+    "https://",
+    HTTPAdapter(
+        pool_connections=4,
+        pool_maxsize=32,
+        max_retries=Retry(
+            total=5,
+            backoff_factor=0.5,
+            status_forcelist=[429, 500, 502, 503, 504],
+            allowed_methods=["GET", "POST"],
+        ),
+    ),
+)
+# Сжатие ответов и постоянное соединение для всех запросов сессии.
+_SESSION.headers.update(
+    {
+        "Accept-Encoding": "gzip",
+        "Connection": "keep-alive",
+        "Content-Type": "application/json",
+    }
+)
+
+# Шаблон для очистки цены от всего, кроме цифр.
+_NONDIGIT = re.compile(r"[^0-9]")
+
 
 def get_product_list(last_id, client_id, seller_token):
     """Получает список товаров из магазина OZON.
@@ -44,9 +81,9 @@ def get_product_list(last_id, client_id, seller_token):
         "last_id": last_id,
         "limit": 1000,
     }
-    response = requests.post(url, json=payload, headers=headers)
+    response = _SESSION.post(url, data=orjson.dumps(payload), headers=headers)
     response.raise_for_status()
-    response_object = response.json()
+    response_object = orjson.loads(response.content)
     return response_object.get("result")
 
 
@@ -70,21 +107,27 @@ def get_offer_ids(client_id, seller_token):
     Raises:
         requests.exceptions.HTTPError: Если запрос к API завершился неудачно.
     """
+    # Курсор last_id приходит только в ответе на предыдущую страницу,
+    # поэтому сами страницы запрашиваются строго последовательно.
     last_id = ""
-    product_list = []
+    offer_ids = []
     while True:
         some_prod = get_product_list(last_id, client_id, seller_token)
-        product_list.extend(some_prod.get("items"))
+        for product in some_prod.get("items"):
+            offer_ids.append(product.get("offer_id"))
         total = some_prod.get("total")
         last_id = some_prod.get("last_id")
-        if total == len(product_list):
+        if total == len(offer_ids):
             break
-    offer_ids = []
-    for product in product_list:
-        offer_ids.append(product.get("offer_id"))
     return offer_ids
 
 
+@functools.lru_cache(maxsize=None)
+def _get_offer_ids_cached(client_id, seller_token):
+    """Кеширует артикулы по учетным данным, чтобы не повторять постраничный обход."""
+    return tuple(get_offer_ids(client_id, seller_token))
+
+
 def update_price(prices: list, client_id, seller_token):
     """Обновляет цены товаров.
 
@@ -111,9 +154,9 @@ def update_price(prices: list, client_id, seller_token):
         "Api-Key": seller_token,
     }
     payload = {"prices": prices}
-    response = requests.post(url, json=payload, headers=headers)
+    response = _SESSION.post(url, data=orjson.dumps(payload), headers=headers)
     response.raise_for_status()
-    return response.json()
+    return orjson.loads(response.content)
 
 
 def update_stocks(stocks: list, client_id, seller_token):
@@ -142,9 +185,22 @@ def update_stocks(stocks: list, client_id, seller_token):
         "Api-Key": seller_token,
     }
     payload = {"stocks": stocks}
-    response = requests.post(url, json=payload, headers=headers)
+    response = _SESSION.post(url, data=orjson.dumps(payload), headers=headers)
     response.raise_for_status()
-    return response.json()
+    return orjson.loads(response.content)
+
+
+def _read_remnants(excel_file):
+    """Читает таблицу остатков из файла или файлового объекта."""
+    return pd.read_excel(
+        io=excel_file,
+        engine="calamine",
+        na_values=None,
+        keep_default_na=False,
+        header=17,
+        usecols=["Код", "Количество", "Цена"],
+        dtype={"Код": str, "Количество": str, "Цена": str},
+    )
 
 
 def download_stock():
@@ -154,34 +210,118 @@ def download_stock():
     в формате Excel.
 
     Returns:
-        list: Список остатков часов в формате словаря.
+        pandas.DataFrame: Таблица остатков часов с колонками "Код",
+        "Количество" и "Цена".
 
     Example:
         >>> download_stock()
-        [{'Код': '123', 'Количество': '5', 'Цена': '5\'990.00 руб.'}, ...]
+              Код Количество           Цена
+        0     123          5  5'990.00 руб.
 
     Raises:
         requests.exceptions.HTTPError: Если запрос к сайту завершился неудачно.
     """
     # Скачать остатки с сайта
     casio_url = "https://timeworld.ru/upload/files/ostatki.zip"
-    session = requests.Session()
-    response = session.get(casio_url)
-    response.raise_for_status()
-    with response, zipfile.ZipFile(io.BytesIO(response.content)) as archive:
-        archive.extractall(".")
-    # Создаем список остатков часов:
-    excel_file = "ostatki.xls"
-    watch_remnants = pd.read_excel(
-        io=excel_file,
-        na_values=None,
-        keep_default_na=False,
-        header=17,
-    ).to_dict(orient="records")
-    os.remove("./ostatki.xls")  # Удалить файл
+    buffer = io.BytesIO()
+    with _SESSION.get(casio_url, stream=True) as response:
+        response.raise_for_status()
+        # raw не распаковывает Content-Encoding сам по себе.
+        response.raw.decode_content = True
+        shutil.copyfileobj(response.raw, buffer, length=64 * 1024)
+    buffer.seek(0)
+    # Создаем список остатков часов, не распаковывая архив на диск:
+    with zipfile.ZipFile(buffer) as archive:
+        try:
+            with archive.open("ostatki.xls") as excel_file:
+                watch_remnants = _read_remnants(excel_file)
+        except KeyError:
+            # Файл лежит не в корне архива — распакуем во временный
+            # каталог, который удаляется даже при ошибке чтения.
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                archive.extractall(tmp_dir)
+                excel_path = next(
+                    (
+                        os.path.join(root, name)
+                        for root, _, names in os.walk(tmp_dir)
+                        for name in names
+                        if name == "ostatki.xls"
+                    ),
+                    None,
+                )
+                if excel_path is None:
+                    raise FileNotFoundError("В архиве нет файла ostatki.xls")
+                watch_remnants = _read_remnants(excel_path)
     return watch_remnants
 
 
+def _match_offers(watch_remnants, offer_set):
+    """Отбирает строки остатков, чей код есть среди артикулов магазина."""
+    matched = watch_remnants.assign(
+        offer_id=watch_remnants["Код"].astype(str)
+    )
+    return matched[matched["offer_id"].isin(offer_set)]
+
+
+def _stocks_from_matched(matched, offer_set):
+    """Строит записи остатков из отобранных строк и дополняет нулями."""
+    # Для повторяющихся кодов остаток берется из первой строки листа.
+    matched = matched.drop_duplicates(subset="offer_id", keep="first")
+    count = matched["Количество"].astype(str)
+    # Особые значения маскируем перед конвертацией: np.where вычисляет
+    # обе ветки, а некорректные данные должны по-прежнему падать с ValueError.
+    numeric = pd.to_numeric(count.mask(count.isin([">10", "1"]), "0"))
+    stock = np.where(
+        count == ">10",
+        100,
+        np.where(count == "1", 0, numeric),
+    ).astype(int)
+    stocks = matched.assign(stock=stock)[["offer_id", "stock"]].to_dict(
+        orient="records"
+    )
+    # Добавим недостающее из загруженного:
+    for offer_id in offer_set - set(matched["offer_id"]):
+        stocks.append({"offer_id": offer_id, "stock": 0})
+    return stocks
+
+
+def _prices_from_matched(matched):
+    """Строит записи цен из отобранных строк."""
+    price = (
+        matched["Цена"]
+        .astype(str)
+        .str.split(".", n=1)
+        .str[0]
+        .str.replace(r"[^0-9]", "", regex=True)
+    )
+    return matched.assign(
+        auto_action_enabled="UNKNOWN",
+        currency_code="RUB",
+        old_price="0",
+        price=price,
+    )[
+        ["auto_action_enabled", "currency_code", "offer_id", "old_price", "price"]
+    ].to_dict(orient="records")
+
+
+def build_payloads(watch_remnants, offer_ids):
+    """Строит остатки и цены за один проход по таблице остатков.
+
+    Эта функция выполняет сопоставление с артикулами один раз и собирает
+    оба списка для обновления, не повторяя фильтрацию.
+
+    Args:
+        watch_remnants (pandas.DataFrame): Таблица остатков часов.
+        offer_ids (list): Список артикулов товаров.
+
+    Returns:
+        tuple: Список остатков и список цен для обновления.
+    """
+    offer_set = set(offer_ids)
+    matched = _match_offers(watch_remnants, offer_set)
+    return _stocks_from_matched(matched, offer_set), _prices_from_matched(matched)
+
+
 def create_stocks(watch_remnants, offer_ids):
     """Создает список остатков на основе данных о часах.
 
@@ -189,35 +329,22 @@ def create_stocks(watch_remnants, offer_ids):
     и формирует список остатков для обновления.
 
     Args:
-        watch_remnants (list): Список остатков часов.
-        offer_ids (list): Список артикулов товаров.
+        watch_remnants (pandas.DataFrame): Таблица остатков часов.
+        offer_ids (list): Список артикулов товаров; не изменяется.
 
     Returns:
         list: Список остатков для обновления.
 
     Example:
-        >>> create_stocks([{'Код': '123', 'Количество': '5'}], ['123', '124'])
+        >>> df = pd.DataFrame([{'Код': '123', 'Количество': '5'}])
+        >>> create_stocks(df, ['123', '124'])
         [{'offer_id': '123', 'stock': 5}, {'offer_id': '124', 'stock': 0}]
 
     Raises:
         ValueError: Если данные о часах некорректные.
     """
-    stocks = []
-    for watch in watch_remnants:
-        if str(watch.get("Код")) in offer_ids:
-            count = str(watch.get("Количество"))
-            if count == ">10":
-                stock = 100
-            elif count == "1":
-                stock = 0
-            else:
-                stock = int(watch.get("Количество"))
-            stocks.append({"offer_id": str(watch.get("Код")), "stock": stock})
-            offer_ids.remove(str(watch.get("Код")))
-    # Добавим недостающее из загруженного:
-    for offer_id in offer_ids:
-        stocks.append({"offer_id": offer_id, "stock": 0})
-    return stocks
+    offer_set = set(offer_ids)
+    return _stocks_from_matched(_match_offers(watch_remnants, offer_set), offer_set)
 
 
 def create_prices(watch_remnants, offer_ids):
@@ -227,29 +354,19 @@ def create_prices(watch_remnants, offer_ids):
     и формирует список цен для обновления.
 
     Args:
-        watch_remnants (list): Список остатков часов.
+        watch_remnants (pandas.DataFrame): Таблица остатков часов.
         offer_ids (list): Список артикулов товаров.
 
     Returns:
         list: Список цен для обновления.
 
     Example:
-        >>> create_prices([{'Код': '123', 'Цена': '5\'990.00 руб.'}], ['123', '124'])
+        >>> df = pd.DataFrame([{'Код': '123', 'Цена': '5\'990.00 руб.'}])
+        >>> create_prices(df, ['123', '124'])
         [{'auto_action_enabled': 'UNKNOWN', 'currency_code': 'RUB',
         'offer_id': '123', 'old_price': '0', 'price': '5990'}]
-    """    
-    prices = []
-    for watch in watch_remnants:
-        if str(watch.get("Код")) in offer_ids:
-            price = {
-                "auto_action_enabled": "UNKNOWN",
-                "currency_code": "RUB",
-                "offer_id": str(watch.get("Код")),
-                "old_price": "0",
-                "price": price_conversion(watch.get("Цена")),
-            }
-            prices.append(price)
-    return prices
+    """
+    return _prices_from_matched(_match_offers(watch_remnants, set(offer_ids)))
 
 
 def price_conversion(price: str) -> str:
@@ -265,7 +382,25 @@ def price_conversion(price: str) -> str:
         >>> price_conversion("5'990.00 руб.")
         '5990'
     """
-    return re.sub("[^0-9]", "", price.split(".")[0])
+    return _NONDIGIT.sub("", price.split(".", 1)[0])
+
+
+def batched(iterable, n: int):
+    """Разбивает любой итерируемый объект на части по n элементов.
+
+    В отличие от среза по индексам не требует списка на входе, поэтому
+    подходит и для генераторов записей.
+
+    Args:
+        iterable (iterable): Источник элементов.
+        n (int): Количество элементов в каждой части.
+
+    Yields:
+        list: Списки длиной не более n.
+    """
+    iterator = iter(iterable)
+    while chunk := list(itertools.islice(iterator, n)):
+        yield chunk
 
 
 def divide(lst: list, n: int):
@@ -278,68 +413,137 @@ def divide(lst: list, n: int):
     Yields:
         list: Подсписки длиной n.
     """
-    for i in range(0, len(lst), n):
-        yield lst[i : i + n]
+    yield from batched(lst, n)
+
 
+async def _post_batches(update, batches, client_id, seller_token):
+    """Параллельно отправляет пакеты через update с лимитом одновременных запросов.
 
-async def upload_prices(watch_remnants, client_id, seller_token):
+    Args:
+        update (callable): Функция отправки одного пакета (update_price или update_stocks).
+        batches (iterable): Пакеты записей для отправки.
+        client_id (str): Идентификатор клиента для API Ozon.
+        seller_token (str): Токен продавца для API Ozon.
+
+    Returns:
+        list: Пакеты, которые не удалось отправить со второй попытки.
+    """
+    semaphore = asyncio.Semaphore(8)
+
+    async def send(batch):
+        async with semaphore:
+            try:
+                await asyncio.to_thread(update, batch, client_id, seller_token)
+            except requests.exceptions.RequestException as error:
+                logger.warning(
+                    "Не удалось отправить пакет из %d записей: %s",
+                    len(batch),
+                    error,
+                )
+                return batch
+            return None
+
+    results = await asyncio.gather(*[send(batch) for batch in batches])
+    failed = [batch for batch in results if batch is not None]
+    if failed:
+        # Вторая попытка для упавших пакетов — соединение уже прогрето.
+        results = await asyncio.gather(*[send(batch) for batch in failed])
+        failed = [batch for batch in results if batch is not None]
+    return failed
+
+
+async def upload_prices(watch_remnants, client_id, seller_token, offer_ids=None):
     """Загружает цены на товары в API.
 
     Эта функция получает артикулы, создает список цен и загружает
     их в API Ozon.
 
     Args:
-        watch_remnants (list): Список остатков часов.
+        watch_remnants (pandas.DataFrame): Таблица остатков часов.
         client_id (str): Идентификатор клиента для API Ozon.
         seller_token (str): Токен продавца для API Ozon.
+        offer_ids (list, optional): Уже загруженные артикулы; если не
+            переданы, будут запрошены у API.
 
     Returns:
         list: Список загруженных цен.
     """
-    offer_ids = get_offer_ids(client_id, seller_token)
+    if offer_ids is None:
+        offer_ids = _get_offer_ids_cached(client_id, seller_token)
     prices = create_prices(watch_remnants, offer_ids)
-    for some_price in list(divide(prices, 1000)):
-        update_price(some_price, client_id, seller_token)
+    await _post_batches(update_price, divide(prices, 1000), client_id, seller_token)
     return prices
 
 
-async def upload_stocks(watch_remnants, client_id, seller_token):
+async def upload_stocks(watch_remnants, client_id, seller_token, offer_ids=None):
     """Загружает остатки товаров в API.
 
     Эта функция получает артикулы, создает список остатков и загружает
     их в API Ozon.
 
     Args:
-        watch_remnants (list): Список остатков часов.
+        watch_remnants (pandas.DataFrame): Таблица остатков часов.
         client_id (str): Идентификатор клиента для API Ozon.
         seller_token (str): Токен продавца для API Ozon.
+        offer_ids (list, optional): Уже загруженные артикулы; если не
+            переданы, будут запрошены у API.
 
     Returns:
         tuple: Список ненулевых остатков и полный список остатков.
     """
-    offer_ids = get_offer_ids(client_id, seller_token)
+    if offer_ids is None:
+        offer_ids = _get_offer_ids_cached(client_id, seller_token)
     stocks = create_stocks(watch_remnants, offer_ids)
-    for some_stock in list(divide(stocks, 100)):
-        update_stocks(some_stock, client_id, seller_token)
+    await _post_batches(update_stocks, divide(stocks, 100), client_id, seller_token)
     not_empty = list(filter(lambda stock: (stock.get("stock") != 0), stocks))
     return not_empty, stocks
 
 
-def main():
-    """Основная функция для обновления остатков и цен товаров."""
+async def amain():
+    """Асинхронно обновляет остатки и цены товаров.
+
+    Артикулы и файл остатков запрашиваются параллельно, затем оба потока
+    пакетов отправляются одновременно через общий ограничитель.
+    """
+    env = Env()
+    seller_token = env.str("SELLER_TOKEN")
+    client_id = env.str("CLIENT_ID")
+    try:
+        offer_ids, watch_remnants = await asyncio.gather(
+            asyncio.to_thread(get_offer_ids, client_id, seller_token),
+            asyncio.to_thread(download_stock),
+        )
+        stocks, prices = build_payloads(watch_remnants, offer_ids)
+        await asyncio.gather(
+            _post_batches(
+                update_stocks, divide(stocks, 100), client_id, seller_token
+            ),
+            _post_batches(
+                update_price, divide(prices, 900), client_id, seller_token
+            ),
+        )
+    except requests.exceptions.ReadTimeout:
+        print("Превышено время ожидания...")
+    except requests.exceptions.ConnectionError as error:
+        print(error, "Ошибка соединения")
+    except Exception as error:
+        print(error, "ERROR_2")
+
+
+def _sync_main():
+    """Синхронный запасной вариант обновления остатков и цен товаров."""
     env = Env()
     seller_token = env.str("SELLER_TOKEN")
     client_id = env.str("CLIENT_ID")
     try:
         offer_ids = get_offer_ids(client_id, seller_token)
         watch_remnants = download_stock()
+        stocks, prices = build_payloads(watch_remnants, offer_ids)
         # Обновить остатки
-        stocks = create_stocks(watch_remnants, offer_ids)
-        for some_stock in list(divide(stocks, 100)):
+        for some_stock in divide(stocks, 100):
             update_stocks(some_stock, client_id, seller_token)
         # Поменять цены
-        prices = create_prices(watch_remnants, offer_ids)
-        for some_price in list(divide(prices, 900)):
+        for some_price in divide(prices, 900):
             update_price(some_price, client_id, seller_token)
     except requests.exceptions.ReadTimeout:
         print("Превышено время ожидания...")
@@ -349,5 +553,10 @@ def main():
         print(error, "ERROR_2")
 
 
+def main():
+    """Основная функция для обновления остатков и цен товаров."""
+    asyncio.run(amain())
+
+
 if __name__ == "__main__":
     main()